@@ -11,13 +11,26 @@ import argparse
 
 from nmigen             import Elaboratable
 from nmigen._unused     import MustUse
+from nmigen.build.run   import LocalBuildProducts
 
-from .gateware.platform import get_appropriate_platform
+from .gateware.platform       import get_appropriate_platform
+from .gateware.platform.cache import clear_bitstream_cache
 
 # Log formatting strings.
 LOG_FORMAT_COLOR = "\u001b[37;1m%(levelname)-8s| \u001b[0m\u001b[1m%(module)-12s|\u001b[0m %(message)s"
 LOG_FORMAT_PLAIN = "%(levelname)-8s:n%(module)-12s>%(message)s"
 
+# Description of the environment variables that affect our CLI; shown in its help.
+CLI_ENVIRONMENT_HELP = """\
+environment variables:
+  LUNA_PLATFORM              selects the target platform, as <module>:<class>
+  LUNA_PREBUILT_BITSTREAM    uploads/flashes the given bitstream file (.bit or .rbf) without building
+  LUNA_BITSTREAM_CACHE=0     disables re-use of previously-built bitstreams
+  LUNA_BITSTREAM_COMPRESS=0  disables bitstream compression (Apollo-based LUNA boards)
+  LUNA_MSPI_FREQ             sets the flash configuration clock, in MHz (Apollo-based LUNA boards)
+  LUNA_NEXTPNR_THREADS       sets the number of nextpnr threads; 0 omits --threads (Apollo-based LUNA boards)
+"""
+
 
 def configure_default_logging(level=logging.INFO, logger=logging):
 
@@ -46,7 +59,8 @@ def top_level_cli(fragment, *pos_args, cli_soc=None, **kwargs):
 
     name = fragment.__name__ if callable(fragment) else fragment.__class__.__name__
 
-    parser = argparse.ArgumentParser(description=f"Gateware generation/upload script for '{name}' gateware.")
+    parser = argparse.ArgumentParser(description=f"Gateware generation/upload script for '{name}' gateware.",
+        formatter_class=argparse.RawDescriptionHelpFormatter, epilog=CLI_ENVIRONMENT_HELP)
     parser.add_argument('--output', '-o', metavar='filename', help="Build and output a bitstream to the given file.")
     parser.add_argument('--erase', '-E', action='store_true',
          help="Clears the relevant FPGA's flash before performing other options.")
@@ -57,7 +71,10 @@ def top_level_cli(fragment, *pos_args, cli_soc=None, **kwargs):
     parser.add_argument('--dry-run', '-D', action='store_true',
          help="When provided as the only option; builds the relevant bitstream without uploading or flashing it.")
     parser.add_argument('--keep-files', action='store_true',
-         help="Keeps the local files in the default `build` folder.")
+         help="Keeps the local files in the default `build` folder. Builds served from the bitstream cache "
+              "only provide the bitstreams; set LUNA_BITSTREAM_CACHE=0 to keep every intermediate file.")
+    parser.add_argument('--clear-cache', action='store_true',
+         help="Removes all previously-built bitstreams from the bitstream cache before building.")
     parser.add_argument('--fpga', metavar='part_number',
          help="Overrides build configuration to build for a given FPGA. Useful if no FPGA is connected during build.")
     parser.add_argument('--console', metavar="port",
@@ -111,6 +128,9 @@ def top_level_cli(fragment, *pos_args, cli_soc=None, **kwargs):
         print(f"0x{cli_soc.main_ram_address():08x}")
         sys.exit(0)
 
+    if args.clear_cache:
+        clear_bitstream_cache()
+
     # Build the relevant gateware, uploading if requested.
     build_dir = "build" if args.keep_files else tempfile.mkdtemp()
 
@@ -131,23 +151,41 @@ def top_level_cli(fragment, *pos_args, cli_soc=None, **kwargs):
             platform.toolchain_erase()
             logging.info("Erase complete.")
 
-        join_text = "and uploading gateware to attached" if args.upload else "for"
-        logging.info(f"Building {join_text} {platform.name}...")
+        # If we've been provided with a prebuilt bitstream, we don't need to build anything;
+        # instead, we'll present the prebuilt bitstream as our build products. We keep its extension,
+        # as platforms differ in which bitstream format they consume (e.g. .bit or .rbf).
+        bitstream_filename = "top.bit"
+        prebuilt = os.getenv("LUNA_PREBUILT_BITSTREAM")
+        if prebuilt:
+            bitstream_filename = "top" + os.path.splitext(prebuilt)[1]
+
+            os.makedirs(build_dir, exist_ok=True)
+            shutil.copyfile(prebuilt, os.path.join(build_dir, bitstream_filename))
+            products = LocalBuildProducts(build_dir)
+
+            if args.upload:
+                logging.info(f"Uploading prebuilt bitstream {prebuilt} to attached {platform.name}...")
+                platform.toolchain_program(products, "top")
+                logging.info("Upload complete.")
+
+        else:
+            join_text = "and uploading gateware to attached" if args.upload else "for"
+            logging.info(f"Building {join_text} {platform.name}...")
 
-        # If we have an SoC, allow it to perform any pre-elaboration steps it wants.
-        # This allows it to e.g. build a BIOS or equivalent firmware.
-        if cli_soc and hasattr(cli_soc, 'build'):
-            cli_soc.build(build_dir=build_dir)
+            # If we have an SoC, allow it to perform any pre-elaboration steps it wants.
+            # This allows it to e.g. build a BIOS or equivalent firmware.
+            if cli_soc and hasattr(cli_soc, 'build'):
+                cli_soc.build(build_dir=build_dir)
 
 
-        # Now that we're actually building, re-enable Unused warnings.
-        MustUse._MustUse__silence = False
-        products = platform.build(fragment,
-            do_program=args.upload,
-            build_dir=build_dir
-        )
+            # Now that we're actually building, re-enable Unused warnings.
+            MustUse._MustUse__silence = False
+            products = platform.build(fragment,
+                do_program=args.upload,
+                build_dir=build_dir
+            )
 
-        logging.info(f"{'Upload' if args.upload else 'Build'} complete.")
+            logging.info(f"{'Upload' if args.upload else 'Build'} complete.")
 
         # If we're flashing the FPGA's flash, do so.
         if args.flash:
@@ -157,7 +195,7 @@ def top_level_cli(fragment, *pos_args, cli_soc=None, **kwargs):
 
         # If we're outputting a file, write it.
         if args.output:
-            bitstream =  products.get("top.bit")
+            bitstream =  products.get(bitstream_filename)
             with open(args.output, "wb") as f:
                 f.write(bitstream)
 
@@ -21,7 +21,7 @@ from .luna_r0_4 import LUNAPlatformRev0D4
 from .daisho    import DaishoPlatform
 from .amalthea  import AmaltheaPlatformRev0D1
 
-from .core      import NullPin
+from .core      import NullPin, LUNAApolloPlatform, _lazy_apollo
 
 
 
@@ -77,11 +77,13 @@ def get_appropriate_platform() -> LatticeECP5Platform:
     if os.getenv("LUNA_PLATFORM"):
         return _get_platform_from_string(os.getenv("LUNA_PLATFORM"))
 
-    import apollo_fpga
+    apollo = _lazy_apollo()
 
     try:
-        # Figure out what hardware revision we're going to connect to...
-        debugger = apollo_fpga.ApolloDebugger()
+        # Figure out what hardware revision we're going to connect to. Note that this opens the
+        # shared debugger connection, which stays open for the rest of the process, so later
+        # operations can re-use it; see LUNAApolloPlatform.release_debugger.
+        debugger = LUNAApolloPlatform._get_debugger()
         version = debugger.detect_connected_version()
 
         # ... and look up the relevant platform accordingly.
@@ -96,7 +98,7 @@ def get_appropriate_platform() -> LatticeECP5Platform:
 
 
     # If we don't have a connected platform, fall back to the latest platform.
-    except apollo_fpga.DebuggerNotFound:
+    except apollo.DebuggerNotFound:
         platform = LATEST_PLATFORM()
 
         logging.warning(f"Couldn't auto-detect connected platform. Assuming {platform.name}.")
@@ -8,7 +8,8 @@ from nmigen.build import *
 from nmigen.vendor.lattice_ecp5 import LatticeECP5Platform
 from nmigen_boards.resources import *
 
-from .core import LUNAPlatform
+from .core  import LUNAPlatform, LUNAApolloPlatform, _lazy_apollo
+from .cache import cached_build_plan
 from ..architecture.car import LunaECP5DomainGenerator
 
 
@@ -157,54 +158,69 @@ class AmaltheaPlatformRev0D1(LatticeECP5Platform, LUNAPlatform):
             'ecppack_opts': '--compress --freq 38.8'
         }
 
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        # Re-use the products of identical, previous builds; which includes the flash-bridge
+        # gateware that's built each time we need to work with the board's flash.
+        plan = super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return cached_build_plan(plan, name, tools=self.required_tools, env_var=self._toolchain_env_var)
 
 
     def toolchain_program(self, products, name):
         """ Programs the relevant LUNA board via its sideband connection. """
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.ecp5 import ECP5_JTAGProgrammer
+        apollo_ecp5 = _lazy_apollo("ecp5")
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
+        # Get our connection to the debug module.
+        debugger = LUNAApolloPlatform._get_debugger()
 
         # Grab our generated bitstream, and upload it to the FPGA.
         bitstream =  products.get("{}.bit".format(name))
         with debugger.jtag as jtag:
-            programmer = ECP5_JTAGProgrammer(jtag)
+            programmer = apollo_ecp5.ECP5_JTAGProgrammer(jtag)
             programmer.configure(bitstream)
 
 
-    def toolchain_flash(self, products, name="top"):
-        """ Programs the LUNA board's flash via its sideband connection. """
+    def toolchain_flash(self, products, name="top", soft_reset=True):
+        """ Programs the LUNA board's flash via its sideband connection.
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.flash import ensure_flash_gateware_loaded
+        If ``soft_reset`` is False, the FPGA isn't reset afterwards; see ``toolchain_finalize``.
+        """
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
-        ensure_flash_gateware_loaded(debugger, platform=self.__class__())
+        apollo_flash = _lazy_apollo("flash")
+
+        # Get our connection to the debug module.
+        debugger = LUNAApolloPlatform._get_debugger()
+        apollo_flash.ensure_flash_gateware_loaded(debugger, platform=self.__class__())
 
         # Grab our generated bitstream, and upload it to the .
         bitstream =  products.get("{}.bit".format(name))
         with debugger.flash as flash:
             flash.program(bitstream)
 
-        debugger.soft_reset()
+        if soft_reset:
+            debugger.soft_reset()
+
 
+    def toolchain_erase(self, soft_reset=True):
+        """ Erases the LUNA board's flash.
 
-    def toolchain_erase(self):
-        """ Erases the LUNA board's flash. """
+        If ``soft_reset`` is False, the FPGA isn't reset afterwards; see ``toolchain_finalize``.
+        """
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.flash import ensure_flash_gateware_loaded
+        apollo_flash = _lazy_apollo("flash")
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
-        ensure_flash_gateware_loaded(debugger, platform=self.__class__())
+        # Get our connection to the debug module.
+        debugger = LUNAApolloPlatform._get_debugger()
+        apollo_flash.ensure_flash_gateware_loaded(debugger, platform=self.__class__())
 
         with debugger.flash as flash:
             flash.erase()
 
+        if soft_reset:
+            debugger.soft_reset()
+
+
+    def toolchain_finalize(self):
+        """ Resets the FPGA; completing a batch of operations performed with ``soft_reset=False``. """
+
+        debugger = LUNAApolloPlatform._get_debugger()
         debugger.soft_reset()
@@ -0,0 +1,289 @@
+#
+# This file is part of LUNA.
+#
+# Copyright (c) 2021 Great Scott Gadgets <info@greatscottgadgets.com>
+# SPDX-License-Identifier: BSD-3-Clause
+
+""" Build-product caching for LUNA platforms. """
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import unittest
+
+from unittest           import TestCase, mock
+from nmigen._toolchain  import has_tool, require_tool
+from nmigen.build.run   import BuildPlan
+
+
+def bitstream_cache_directory():
+    """ Returns the directory in which cached build products are stored. """
+
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "luna", "bitstreams")
+
+
+def clear_bitstream_cache():
+    """ Removes all cached build products. """
+
+    shutil.rmtree(bitstream_cache_directory(), ignore_errors=True)
+
+
+def cached_build_plan(plan, name, tools=(), env_var=None):
+    """ Wraps a build plan so it re-uses the products of identical, previous builds.
+
+    Caching can be disabled by setting LUNA_BITSTREAM_CACHE=0; and the cache can be emptied with
+    ``clear_bitstream_cache``, or by deleting the directory returned by ``bitstream_cache_directory``.
+
+    Tools are only identified by their executables, and by the toolchain environment script (if any);
+    so updates that don't replace those (e.g. a new prjtrellis database used by an existing ecppack)
+    aren't detected, and will require disabling or clearing the cache. If any tool can't be located
+    -- e.g. because it's only placed on the PATH by the environment script -- caching is skipped.
+
+    Only the bitstreams themselves are cached; so a build served from the cache leaves only the
+    build script, its inputs, and the ``.bit`` and ``.svf`` files in the build directory. Builds
+    whose intermediate products are needed should disable the cache.
+
+    Parameters
+    ----------
+    plan: BuildPlan
+        The build plan to be wrapped.
+    name: str
+        The name of the design being built.
+    tools: iterable of str
+        The names of the tools used to execute the build plan; e.g. the platform's ``required_tools``.
+    env_var: str, optional
+        The name of the variable that points to the toolchain's environment script, if any;
+        e.g. the platform's ``_toolchain_env_var``.
+    """
+
+    if os.getenv("LUNA_BITSTREAM_CACHE", "1") == "0":
+        return plan
+
+    missing_tools = [tool for tool in tools if not has_tool(tool)]
+    if missing_tools:
+        logging.warning(f"Not caching build products, as {', '.join(missing_tools)} couldn't be located.")
+        return plan
+
+    return CachedBuildPlan(plan, name, tools=tools, env_var=env_var)
+
+
+class CachedBuildPlan(BuildPlan):
+    """ Build plan that re-uses the products of identical, previously-executed builds.
+
+    Builds are identified by the contents of every file in the plan -- which covers the
+    netlist, constraints, and build script (and thus the device and toolchain options) --
+    alongside the location and modification time of each tool used to perform the build, and
+    the toolchain environment script that the build script sources.
+
+    Parameters
+    ----------
+    plan: BuildPlan
+        The build plan to be wrapped; its files are shared with this plan.
+    name: str
+        The name of the design being built; used to locate its build products.
+    tools: iterable of str
+        The names of the tools used to execute the build plan.
+    env_var: str, optional
+        The name of the variable that points to the toolchain's environment script, if any.
+    """
+
+    # Extensions of the build products we'll preserve in our cache. We only keep the (relatively small)
+    # bitstreams, as our cache is never pruned; intermediate products such as netlists aren't kept.
+    CACHED_EXTENSIONS = ("bit", "svf")
+
+    def __init__(self, plan, name, tools=(), env_var=None):
+        super().__init__(plan.script)
+
+        self.files    = plan.files
+        self._name    = name
+        self._tools   = tuple(tools)
+        self._env_var = env_var
+
+
+    @staticmethod
+    def _tool_fingerprint(tool):
+        """ Returns a string that changes whenever the given tool is replaced. """
+
+        # Find the tool the same way our build script will: by preferring any environment override.
+        path = shutil.which(require_tool(tool))
+
+        stat = os.stat(path)
+        return f"{tool}:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+    def _environment_fingerprint(self):
+        """ Returns the contents of the toolchain environment script sourced by our build script. """
+
+        script = os.environ.get(self._env_var) if self._env_var else None
+        if not script:
+            return b""
+
+        try:
+            with open(script, "rb") as f:
+                return script.encode("utf-8") + b"\0" + f.read()
+        except OSError:
+            return script.encode("utf-8")
+
+
+    def cache_key(self):
+        """ Returns the key that identifies this build in our bitstream cache. """
+
+        key = hashlib.sha256(self.digest())
+        for tool in self._tools:
+            key.update(self._tool_fingerprint(tool).encode("utf-8"))
+
+        key.update(self._environment_fingerprint())
+        return key.hexdigest()
+
+
+    def execute_local(self, root="build", *, run_script=True):
+        if not run_script:
+            return super().execute_local(root, run_script=False)
+
+        cache_dir = os.path.join(bitstream_cache_directory(), self.cache_key())
+        filenames = [f"{self._name}.{extension}" for extension in self.CACHED_EXTENSIONS]
+
+        # If we've already built an identical design, extract our build files, but skip running
+        # the toolchain entirely; and instead pull our products from the cache.
+        if os.path.isfile(os.path.join(cache_dir, f"{self._name}.bit")):
+            logging.info(f"Using cached build products from {cache_dir}.")
+
+            products = super().execute_local(root, run_script=False)
+            for filename in filenames:
+                cached_file = os.path.join(cache_dir, filename)
+                if os.path.isfile(cached_file):
+                    shutil.copyfile(cached_file, os.path.join(root, filename))
+
+            return products
+
+        # Otherwise, run our build as normal...
+        products = super().execute_local(root)
+
+        # ... and store its products for later re-use. We populate a scratch directory and then
+        # move it into place, so concurrent builds never see a partially-populated cache entry.
+        # Failing to populate the cache shouldn't fail the build, so we only warn on errors.
+        try:
+            os.makedirs(os.path.dirname(cache_dir), exist_ok=True)
+            scratch_dir = tempfile.mkdtemp(dir=os.path.dirname(cache_dir))
+
+            for filename in filenames:
+                built_file = os.path.join(root, filename)
+                if os.path.isfile(built_file):
+                    shutil.copyfile(built_file, os.path.join(scratch_dir, filename))
+
+            try:
+                os.rename(scratch_dir, cache_dir)
+            except OSError:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+
+        except OSError as e:
+            logging.warning(f"Couldn't cache build products: {e}")
+
+        return products
+
+
+class CachedBuildPlanTest(TestCase):
+
+    def setUp(self):
+        self.scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(self.scratch.cleanup)
+
+        # Point our cache into our scratch directory, rather than at the user's real cache.
+        environment = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.scratch.name, "cache")})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+        # Create a trivial build plan, which marks that it's been run, and produces a "bitstream".
+        self.plan = BuildPlan("build_top")
+        self.plan.add_file("top.il", "design")
+        self.plan.add_file("build_top.sh", "touch ran\necho bitstream > top.bit\n")
+
+
+    def build(self, plan, directory):
+        root = os.path.join(self.scratch.name, directory)
+        products = plan.execute_local(root)
+        return root, products
+
+
+    def test_cache_miss(self):
+        root, products = self.build(cached_build_plan(self.plan, "top"), "first")
+
+        self.assertTrue(os.path.exists(os.path.join(root, "ran")))
+        self.assertEqual(products.get("top.bit"), b"bitstream\n")
+        self.assertEqual(os.listdir(bitstream_cache_directory()), [CachedBuildPlan(self.plan, "top").cache_key()])
+
+
+    def test_cache_hit(self):
+        self.build(cached_build_plan(self.plan, "top"), "first")
+        root, products = self.build(cached_build_plan(self.plan, "top"), "second")
+
+        # Our second build should have been served from the cache, without running our script.
+        self.assertFalse(os.path.exists(os.path.join(root, "ran")))
+        self.assertEqual(products.get("top.bit"), b"bitstream\n")
+
+
+    def test_changed_plan_misses(self):
+        self.build(cached_build_plan(self.plan, "top"), "first")
+
+        changed = BuildPlan("build_top")
+        changed.add_file("top.il", "changed design")
+        changed.add_file("build_top.sh", self.plan.files["build_top.sh"])
+        root, _ = self.build(cached_build_plan(changed, "top"), "second")
+
+        self.assertTrue(os.path.exists(os.path.join(root, "ran")))
+
+
+    def test_changed_environment_misses(self):
+        env_script = os.path.join(self.scratch.name, "env.sh")
+        with open(env_script, "w") as f:
+            f.write("export PATH=/opt/first:$PATH\n")
+
+        with mock.patch.dict(os.environ, {"NMIGEN_ENV_Test": env_script}):
+            self.build(cached_build_plan(self.plan, "top", env_var="NMIGEN_ENV_Test"), "first")
+
+            # Changing the environment script should result in a rebuild.
+            with open(env_script, "w") as f:
+                f.write("export PATH=/opt/second:$PATH\n")
+            root, _ = self.build(cached_build_plan(self.plan, "top", env_var="NMIGEN_ENV_Test"), "second")
+
+        self.assertTrue(os.path.exists(os.path.join(root, "ran")))
+
+
+    def test_cache_disabled(self):
+        with mock.patch.dict(os.environ, {"LUNA_BITSTREAM_CACHE": "0"}):
+            self.assertIs(cached_build_plan(self.plan, "top"), self.plan)
+
+
+    def test_missing_tool(self):
+        with self.assertLogs(level="WARNING"):
+            plan = cached_build_plan(self.plan, "top", tools=["luna-nonexistent-tool"])
+        self.assertIs(plan, self.plan)
+
+
+    def test_clear_cache(self):
+        self.build(cached_build_plan(self.plan, "top"), "first")
+        clear_bitstream_cache()
+
+        root, _ = self.build(cached_build_plan(self.plan, "top"), "second")
+        self.assertTrue(os.path.exists(os.path.join(root, "ran")))
+
+
+    def test_populate_failure(self):
+
+        # Place a file where our cache directory should be, so the cache can't be populated.
+        cache_home = os.environ["XDG_CACHE_HOME"]
+        with open(cache_home, "w"):
+            pass
+
+        with self.assertLogs(level="WARNING"):
+            root, products = self.build(cached_build_plan(self.plan, "top"), "first")
+
+        # A failure to cache shouldn't affect the build itself.
+        self.assertEqual(products.get("top.bit"), b"bitstream\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
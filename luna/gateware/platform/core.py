@@ -6,11 +6,30 @@
 
 """ Utilities for creating LUNA platforms. """
 
+import os
 import logging
+import importlib
 
 from nmigen import Signal, Record
 from nmigen.build.res import ResourceError, Subsignal, Resource, Pins
 
+from .cache import cached_build_plan
+
+
+# Apollo is only needed when working with connected hardware; so its modules are
+# imported on first use, and cached here.
+_apollo_modules = {}
+
+def _lazy_apollo(submodule=None):
+    """ Imports Apollo -- or the given Apollo submodule, e.g. "ecp5" -- on first use, and returns it. """
+
+    name = "apollo_fpga" if submodule is None else f"apollo_fpga.{submodule}"
+
+    if name not in _apollo_modules:
+        _apollo_modules[name] = importlib.import_module(name)
+
+    return _apollo_modules[name]
+
 
 class NullPin(Record):
     """ Stand-in for a I/O record. """
@@ -95,65 +114,187 @@ class LUNAPlatform:
 
 
 class LUNAApolloPlatform(LUNAPlatform):
-    """ Base class for Apollo-based LUNA platforms; includes configuration. """
+    """ Base class for Apollo-based LUNA platforms; includes configuration.
+
+    By default, ``toolchain_flash`` and ``toolchain_erase`` reset the FPGA once they're done,
+    so it reconfigures from its flash. Scripts that perform several operations in a row can
+    pass ``soft_reset=False`` to each, and then call ``toolchain_finalize`` once at the end of
+    the batch to perform a single reset.
+
+    The connection to the Apollo debug controller is opened once, and then held for the rest of
+    the process. Long-running scripts that expect the board to be unplugged or re-enumerated -- or
+    that want to let other programs use it -- should call ``release_debugger`` once they're done
+    with it; the next operation will then open a fresh connection.
+    """
+
+    # Our connection to the Apollo debug controller; created on first use, and shared
+    # between all Apollo-programmed platforms (including those that don't derive from this
+    # class), so repeated operations don't each re-open the device.
+    _debugger = None
+
+    @staticmethod
+    def _get_debugger():
+        """ Returns a connection to the Apollo debug controller, re-using any existing connection. """
+
+        apollo = _lazy_apollo()
+
+        if LUNAApolloPlatform._debugger is None:
+            LUNAApolloPlatform._debugger = apollo.ApolloDebugger()
+
+        return LUNAApolloPlatform._debugger
+
+
+    @staticmethod
+    def release_debugger():
+        """ Closes any open connection to the Apollo debug controller. """
+
+        debugger = LUNAApolloPlatform._debugger
+        LUNAApolloPlatform._debugger = None
+
+        if debugger is not None:
+            import usb.util
+            usb.util.dispose_resources(debugger.device)
+
+
+    # The master-SPI clock frequency (in MHz) used to configure from flash. The ECP5 boots using
+    # the standard SPI read command, which LUNA's flash parts only support at up to 50 MHz; so faster
+    # rates are out of spec unless they're paired with ecppack's --spimode fast-read.
+    default_mspi_frequency = "38.8"
+
+    # Any additional, board-specific options for ecppack.
+    extra_ecppack_opts = []
+
+    def toolchain_prepare(self, fragment, name, **kwargs):
+        """ Prepares a build plan that re-uses the products of identical, previous builds.
+
+        The toolchain's options can be adjusted using the following environment variables:
+
+        - LUNA_BITSTREAM_COMPRESS=0 disables bitstream compression;
+        - LUNA_MSPI_FREQ selects the master-SPI clock (in MHz) used to configure from flash; and
+        - LUNA_NEXTPNR_THREADS limits the threads used by nextpnr; or, if 0, omits its --threads option.
+
+        Any options explicitly provided as keyword arguments take precedence over these.
+        See ``cached_build_plan`` for details on caching, and for how to disable it.
+        """
 
-    def toolchain_program(self, products, name):
-        """ Programs the relevant LUNA board via its sideband connection. """
+        mspi_frequency = os.getenv("LUNA_MSPI_FREQ", self.default_mspi_frequency)
+        ecppack_opts   = [*self.extra_ecppack_opts, '--freq {}'.format(mspi_frequency)]
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.ecp5 import ECP5_JTAGProgrammer
+        # Compressed bitstreams are substantially smaller, and thus upload faster over JTAG.
+        if os.getenv("LUNA_BITSTREAM_COMPRESS", "1") != "0":
+            ecppack_opts.insert(0, '--compress')
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
+        # Allow nextpnr to place-and-route using all of our cores; older nextpnr versions lack
+        # the --threads option, and so it can be omitted.
+        nextpnr_threads = int(os.getenv("LUNA_NEXTPNR_THREADS", os.cpu_count() or 1))
+
+        overrides = {
+            'ecppack_opts': ' '.join(ecppack_opts),
+            'nextpnr_opts': '--threads {}'.format(nextpnr_threads) if nextpnr_threads else '',
+        }
+        overrides.update(kwargs)
+
+        plan = super().toolchain_prepare(fragment, name, **overrides)
+        return cached_build_plan(plan, name, tools=self.required_tools, env_var=self._toolchain_env_var)
+
+
+    def _get_bitstream(self, products, name, prebuilt=None):
+        """ Returns the bitstream for the given design, as consumed by Apollo's programmers.
+
+        Apollo's ECP5 programmer shifts the bitstream out as ``bytes``; so we read it exactly
+        once, here, rather than handing out a memory map it would only copy from.
+
+        If a path to a prebuilt bitstream is provided, it's used in lieu of the build products.
+        """
+
+        if prebuilt:
+            if products is not None:
+                logging.warning(f"Using prebuilt bitstream {prebuilt} in lieu of the build products for '{name}'.")
+
+            with open(prebuilt, "rb") as f:
+                return f.read()
+
+        return products.get("{}.bit".format(name))
+
+
+    def toolchain_program(self, products, name, prebuilt=None):
+        """ Programs the relevant LUNA board via its sideband connection.
+
+        If ``prebuilt`` names a bitstream file, it's uploaded in lieu of the build products.
+        """
+
+        apollo_ecp5 = _lazy_apollo("ecp5")
+
+        # Get our connection to the debug module.
+        debugger = self._get_debugger()
 
         # Grab our generated bitstream, and upload it to the FPGA.
-        bitstream =  products.get("{}.bit".format(name))
+        bitstream = self._get_bitstream(products, name, prebuilt)
         with debugger.jtag as jtag:
-            programmer = ECP5_JTAGProgrammer(jtag)
+            programmer = apollo_ecp5.ECP5_JTAGProgrammer(jtag)
             programmer.configure(bitstream)
 
 
     def _ensure_unconfigured(self, debugger):
         """ Ensures a given FPGA is unconfigured and thus ready for e.g. SPI flashing. """
 
-        from apollo_fpga.ecp5 import ECP5_JTAGProgrammer
+        apollo_ecp5 = _lazy_apollo("ecp5")
 
         with debugger.jtag as jtag:
-            programmer = ECP5_JTAGProgrammer(jtag)
+            programmer = apollo_ecp5.ECP5_JTAGProgrammer(jtag)
             programmer.unconfigure()
 
 
-    def toolchain_flash(self, products, name="top"):
-        """ Programs the LUNA board's flash via its sideband connection. """
+    def toolchain_flash(self, products, name="top", prebuilt=None, soft_reset=True,
+            erase_first=True, disable_protections=False):
+        """ Programs the LUNA board's flash via its sideband connection.
+
+        ``erase_first`` and ``disable_protections`` are passed to Apollo's ``ECP5_JTAGProgrammer.flash``;
+        and respectively control whether the flash is erased before programming, and whether any
+        flash write protections are cleared first.
+
+        If ``prebuilt`` names a bitstream file, it's flashed in lieu of the build products.
+        If ``soft_reset`` is False, the FPGA isn't reset afterwards; see ``toolchain_finalize``.
+        """
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.ecp5 import ECP5_JTAGProgrammer
+        apollo_ecp5 = _lazy_apollo("ecp5")
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
+        # Get our connection to the debug module.
+        debugger = self._get_debugger()
         self._ensure_unconfigured(debugger)
 
         # Grab our generated bitstream, and upload it to the .
-        bitstream =  products.get("{}.bit".format(name))
+        bitstream = self._get_bitstream(products, name, prebuilt)
         with debugger.jtag as jtag:
-            programmer = ECP5_JTAGProgrammer(jtag)
-            programmer.flash(bitstream)
+            programmer = apollo_ecp5.ECP5_JTAGProgrammer(jtag)
+            programmer.flash(bitstream, erase_first=erase_first, disable_protections=disable_protections)
+
+        if soft_reset:
+            debugger.soft_reset()
 
-        debugger.soft_reset()
 
+    def toolchain_erase(self, soft_reset=True):
+        """ Erases the LUNA board's flash.
 
-    def toolchain_erase(self):
-        """ Erases the LUNA board's flash. """
+        If ``soft_reset`` is False, the FPGA isn't reset afterwards; see ``toolchain_finalize``.
+        """
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.ecp5 import ECP5_JTAGProgrammer
+        apollo_ecp5 = _lazy_apollo("ecp5")
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
+        # Get our connection to the debug module.
+        debugger = self._get_debugger()
         self._ensure_unconfigured(debugger)
 
         with debugger.jtag as jtag:
-            programmer = ECP5_JTAGProgrammer(jtag)
+            programmer = apollo_ecp5.ECP5_JTAGProgrammer(jtag)
             programmer.erase_flash()
 
+        if soft_reset:
+            debugger.soft_reset()
+
+
+    def toolchain_finalize(self):
+        """ Resets the FPGA; completing a batch of operations performed with ``soft_reset=False``. """
+
+        debugger = self._get_debugger()
         debugger.soft_reset()
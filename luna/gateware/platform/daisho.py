@@ -14,7 +14,7 @@ from nmigen.vendor.intel import IntelPlatform
 
 from nmigen_boards.resources import *
 
-from .core import LUNAPlatform
+from .core import LUNAPlatform, LUNAApolloPlatform, _lazy_apollo
 from ..architecture.car import PHYResetController
 
 
@@ -376,19 +376,18 @@ class DaishoPlatform(IntelPlatform, LUNAPlatform):
     def toolchain_program(self, products, name):
         """ Programs the relevant Daisho board via its sideband connection. """
 
-        from apollo_fpga import ApolloDebugger
-        from apollo_fpga.intel import IntelJTAGProgrammer
+        apollo_intel = _lazy_apollo("intel")
 
         # If the user has opted to use their own programming cable, use it instead.
         if os.environ.get("PROGRAM_WITH_QUARTUS", False):
             self._toolchain_program_quartus(products, name)
             return
 
-        # Create our connection to the debug module.
-        debugger = ApolloDebugger()
+        # Get our connection to the debug module.
+        debugger = LUNAApolloPlatform._get_debugger()
 
         # Grab our generated bitstream, and upload it to the FPGA.
         bitstream =  products.get("{}.rbf".format(name))
         with debugger.jtag as jtag:
-            programmer = IntelJTAGProgrammer(jtag)
+            programmer = apollo_intel.IntelJTAGProgrammer(jtag)
             programmer.configure(bitstream)
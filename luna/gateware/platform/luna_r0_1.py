@@ -196,9 +196,5 @@ class LUNAPlatformRev0D1(LUNAApolloPlatform, LatticeECP5Platform):
 
     ]
 
-    def toolchain_prepare(self, fragment, name, **kwargs):
-        overrides = {
-            'ecppack_opts': '--compress --idcode {} --freq 38.8'.format(0x21111043)
-        }
-
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+    # Toolchain configuration.
+    extra_ecppack_opts = ['--idcode {}'.format(0x21111043)]
@@ -152,11 +152,3 @@ class LUNAPlatformRev0D2(LUNAApolloPlatform, LatticeECP5Platform):
             A4  -  A3
         """)
     ]
-
-    def toolchain_prepare(self, fragment, name, **kwargs):
-        overrides = {
-            'ecppack_opts': '--compress --freq 38.8'
-        }
-
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
-
@@ -164,10 +164,3 @@ class LUNAPlatformRev0D3(LUNAApolloPlatform, LatticeECP5Platform):
         Connector("pmod", 0, "A3 A4 A5 A6 - - C6 B6 C7 B7 - -"), # Pmod A
         Connector("pmod", 1, "M5 N5 M4 N3 - - L4 L5 K4 K5 - -"), # Pmod B
     ]
-
-    def toolchain_prepare(self, fragment, name, **kwargs):
-        overrides = {
-            'ecppack_opts': '--compress --freq 38.8'
-        }
-
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)